@@ -11,6 +11,7 @@
 #
 #==============================================================================
 from xpg import XpGraph, MarcoXpG
+from pysat.formula import CNF
 
 import getopt
 import resource
@@ -30,6 +31,8 @@ def usage():
     print('Usage:', os.path.basename(sys.argv[0]), '[options] eXplanation Graph (XpG)')
     print('Options:')
     print('        -a, --all        List all explanation')
+    print('        -c, --constraints=<string>')
+    print('                         DIMACS file of background constraints over features')
     print('        -h, --help')
     print('        -H, --Horn       Use Horn encoding for computing AXp')
     print('        -s, --save-exp   Save explanation')
@@ -48,8 +51,9 @@ def parse_options():
 
     try:
         opts, args = getopt.getopt(sys.argv[1:],
-                                   'ahHvx:',
+                                   'ac:hHvx:',
                                    ['all',
+                                    'constraints=',
                                     'help',
                                     'Horn',
                                     'verb',
@@ -64,10 +68,13 @@ def parse_options():
     verb = 1
     xtype = 'AXp'
     horn = False
+    cfile = None
 
     for opt, arg in opts:
         if  opt in ('-a', '--all'):
             all_xp = True
+        elif opt in ('-c', '--constraints'):
+            cfile = str(arg)
         elif opt in ('-h', '--help'):
             usage()
             sys.exit(0)
@@ -81,12 +88,12 @@ def parse_options():
             assert False, 'Unhandled option: {0} {1}'.format(opt, arg)
 
 
-    return all_xp, horn, verb, xtype, args
+    return all_xp, cfile, horn, verb, xtype, args
 
 #==============================================================================
 if __name__=='__main__':
 
-    all_xp, horn, verb, xtype, files = parse_options()
+    all_xp, cfile, horn, verb, xtype, files = parse_options()
 
     if not files:
         exit()
@@ -98,6 +105,9 @@ if __name__=='__main__':
 
     print("load xpgraph from ",files[0])
     xpG = XpGraph.from_file(files[0])
+    if cfile:
+        print("load constraints from ", cfile)
+        xpG.add_constraints(CNF(from_file=cfile).clauses)
     marco = MarcoXpG(xpG, verb, horn)
 
     if all_xp:
@@ -112,6 +122,8 @@ if __name__=='__main__':
     else:
         assert False, 'Unkown option!'
 
+    xpG.delete()
+
 
 
     
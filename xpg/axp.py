@@ -30,7 +30,8 @@ class Abductive(object):
             :param xpg: given an XpGraph
             :param fixed: a list of features declared as fixed.
             :return: one abductive explanation,
-                        each element in the return AXp is a feature index.
+                        each element in the return AXp is a feature index,
+                        empty if no other class can be reached.
         """
 
         ######################################################
@@ -95,17 +96,22 @@ class Abductive(object):
         if not fixed:
             fixed = [True for _ in range(xpg.nv)]
 
-        if 'enc' not in dir(self):
+        if not xpg.path_to_zero([True for _ in range(xpg.nv)]):
+            # no other class can be reached (e.g. due to background constraints),
+            # so the prediction holds whatever the features: the AXp is empty
+            expl = []
+        # background constraints cannot be captured by the Horn encoding,
+        # in which case the (SAT-based) oracle of the XpGraph is used
+        elif 'enc' not in dir(self) or xpg.constraints:
             expl = traverse(xpg, fixed)
         else:
             expl = slv_horn(xpg, fixed)
-        assert len(expl), 'AXp cannot be an empty-set!'
 
         time = resource.getrusage(resource.RUSAGE_CHILDREN).ru_utime + \
                resource.getrusage(resource.RUSAGE_SELF).ru_utime - time
 
         if self.verbose:
-            feats_output = [self.features[i] for i in range(len(fixed)) if fixed[i]]
+            feats_output = [self.features[i] for i in expl]
             if self.verbose == 1:
                 print(f"AXp: {expl}")
             else:
@@ -154,10 +160,13 @@ def horn_encoding(xpg, verb=0):
     Horn = CNF()
     for nd in G.nodes:
         if not G.out_degree(nd):
-            if G.nodes[nd]['target']:
+            if G.nodes[nd]['target'] == xpg.y_pred:
                 Horn.append([new_var('b_{0}'.format(nd))])
             else:
                 Horn.append([-new_var('b_{0}'.format(nd))])
+        elif not xpg.can_reach_other(nd):
+            # only terminals of the predicted class are reachable from nd
+            continue
         else:
             var_n = new_var('b_{0}'.format(nd))
             u = new_var('u_{0}'.format(G.nodes[nd]['var']))
@@ -26,7 +26,8 @@ class Contrastive:
             :param xpg: given an XpGraph
             :param univ: a list of features declared as universal.
             :return: one contrastive explanation,
-                        each element in the return CXp is a feature index.
+                        each element in the return CXp is a feature index,
+                        None if no other class can be reached from univ.
         """
 
         time = resource.getrusage(resource.RUSAGE_CHILDREN).ru_utime + \
@@ -35,6 +36,12 @@ class Contrastive:
         if not univ:
             univ = [True for _ in range(xpg.nv)]
 
+        if not xpg.path_to_zero(univ):
+            # e.g. background constraints rule out every other class
+            if self.verbose:
+                print("CXp: None")
+            return None
+
         for i in range(len(univ)):
             # simple deletion-based linear search
             if univ[i]:
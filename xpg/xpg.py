@@ -5,7 +5,7 @@
 #
 # ==============================================================================
 
-from pysat.formula import IDPool
+from pysat.formula import CNF, IDPool
 from pysat.solvers import Solver
 
 from queue import Queue
@@ -25,16 +25,24 @@ class XpGraph(object):
         eXplanation Graph model, an abstract model of graph-based classifier.
     """
 
-    def __init__(self, graph, root, nvars, features=None, targets=None, y_pred=None, verb=0):
+    def __init__(self, graph, root, nvars, features=None, targets=None, y_pred=None,
+                 constraints=None, verb=0):
         self.graph = graph
         self.root = root
         self.nv = nvars
         self.features = features
         self.classes = targets
-        self.y_pred = y_pred
         self.verbose = verb
-
-   
+        # classes reachable from each node, computed once on demand
+        self.reach = None
+        if y_pred is None:
+            y_pred = self.graph.nodes[self.decision_leaf()]['target']
+        self.y_pred = y_pred
+        # background constraints over features, and the SAT oracle respecting them
+        self.constraints = []
+        self.oracle = None
+        if constraints:
+            self.add_constraints(constraints)
 
     @classmethod
     def from_file(cls, filename):
@@ -51,6 +59,7 @@ class XpGraph(object):
         lines = list(filter(lambda l: (not (l.startswith('#') or l.strip() == '')), lines))
 
         features = []
+        targets = []
         index = 0
         assert (lines[index].strip().startswith('NN:'))
         n_nds = (lines[index].strip().split())[1]
@@ -69,8 +78,12 @@ class XpGraph(object):
 
         t_nds = []
         while not lines[index].strip().startswith('NT:'):
-            nd, t = lines[index].strip().split()
-            t_nds.append(tuple((int(nd), {'target': int(t)})))
+            string = lines[index].strip().split()
+            nd = string[0]
+            target = ' '.join(string[1:])
+            if target not in targets:
+                targets.append(target)
+            t_nds.append(tuple((int(nd), {'target': targets.index(target)})))
             index += 1
 
         assert (lines[index].strip().startswith('NT:'))
@@ -109,38 +122,193 @@ class XpGraph(object):
         G.add_nodes_from(t_nds)
         G.add_nodes_from(nt_nds)
         G.add_edges_from(edges)
-        return cls(G, int(root), int(nvars), features=features)
+        return cls(G, int(root), int(nvars), features=features, targets=targets)
+
+    def add_constraints(self, clauses):
+        """
+            Attach background constraints (domain knowledge) over features.
+            Literal i+1 (resp. -(i+1)) states that i-th feature takes
+            (resp. does not take) its value in the given instance.
+
+            The instance itself (all features taking their value) must satisfy
+            the constraints, i.e. each clause needs a positive literal.
+
+            :param clauses: a list of clauses (CNF) over features.
+        """
+
+        clauses = [list(cl) for cl in clauses]
+        for cl in clauses:
+            if not all(0 < abs(l) <= self.nv for l in cl):
+                raise ValueError(f'unknown feature in constraint {cl}')
+            if not any(l > 0 for l in cl):
+                raise ValueError(f'constraint {cl} is violated by the instance')
+        self.constraints.extend(clauses)
+        # the oracle must be rebuilt
+        self.delete()
+
+    def delete(self):
+        """
+            Free the SAT oracle used under background constraints, if any.
+            It is built again on demand.
+        """
+
+        if self.oracle is not None:
+            self.oracle.delete()
+            self.oracle = None
+
+    def __enter__(self):
+        """
+            'with' constructor.
+        """
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+            'with' destructor.
+        """
+
+        self.delete()
+
+    def reachable_classes(self):
+        """
+            Compute, for each node, the set of classes of the terminals
+            reachable from it (whatever the values of the features).
+            The result is computed once and cached.
+
+            :return: dict mapping each node to a frozenset of class indices.
+        """
+
+        if self.reach is None:
+            G = self.graph
+            self.reach = dict()
+            for nd in reversed(list(nx.topological_sort(G))):
+                if not G.out_degree(nd):
+                    self.reach[nd] = frozenset([G.nodes[nd]['target']])
+                else:
+                    self.reach[nd] = frozenset().union(*(self.reach[s] for s in G.successors(nd)))
+        return self.reach
+
+    def can_reach_other(self, nd):
+        """
+            Check whether some terminal whose class differs from the prediction
+            is reachable from a given node.
+
+            :param nd: given node.
+            :return: true if such a terminal is reachable else false.
+        """
+
+        return bool(self.reachable_classes()[nd] - {self.y_pred})
 
     def path_to_zero(self, univ):
         """
-            Check whether there is a consistent path to desired terminal 0.
+            Check whether there is a consistent path to desired terminal 0,
+            i.e. to a terminal whose class differs from the prediction.
 
             :param univ: a list of features declared as universal.
             :return: true if there is a path to 0 else false.
         """
 
+        if self.constraints:
+            return self.path_to_zero_sat(univ)
+
         G = self.graph
         # BFS (Breadth-first search)
         q = Queue()
         q.put(self.root)
+        visited = {self.root}
         while not q.empty():
             nd = q.get()
             if not G.out_degree(nd):
-                if not G.nodes[nd]['target']:
+                if G.nodes[nd]['target'] != self.y_pred:
                     return True
             else:
                 if univ[G.nodes[nd]['var']]:
-                    for s in G.successors(nd):
-                        q.put(s)
+                    succ = list(G.successors(nd))
                 else:
                     for s in G.successors(nd):
                         if G.edges[nd, s]['label']:
-                            q.put(s)
+                            succ = [s]
                             break
                     else:
                         assert False, 'dead end branch'
+                for s in succ:
+                    # skip sub-graphs leading only to the predicted class
+                    if s not in visited and self.can_reach_other(s):
+                        visited.add(s)
+                        q.put(s)
         return False
 
+    def path_to_zero_sat(self, univ):
+        """
+            Check whether there is a consistent path to desired terminal 0
+            which respects the background constraints, using a SAT oracle.
+
+            :param univ: a list of features declared as universal.
+            :return: true if there is a path to 0 else false.
+        """
+
+        if not self.can_reach_other(self.root):
+            return False
+        if self.oracle is None:
+            self.oracle = Solver(name="glucose3", bootstrap_with=self.path_encoding())
+        # fixed features take their value in the instance
+        return self.oracle.solve(assumptions=[i + 1 for i in range(self.nv) if not univ[i]])
+
+    def path_encoding(self):
+        """
+            CNF encoding of the paths from the root to a terminal whose class
+            differs from the prediction, conjoined with the background constraints.
+            Variable i+1 denotes that i-th feature takes its value in the instance.
+            As in the traversal, each node is left independently: a feature
+            taking its value follows the 1-edges only, otherwise any edge can be
+            followed, and following a 0-edge means the feature changes.
+
+            :return: CNF which is satisfiable iff there exists such a path.
+        """
+
+        #########################################
+        vpool = IDPool()
+
+        def new_var(name):
+            """
+                Inner function,
+                Find or new a PySAT variable.
+                See PySat.
+
+                :param name: name of variable
+                :return: index of variable
+            """
+            return vpool.id(f'{name}')
+        #########################################
+
+        # i-th feature is mapped to variable i+1, as in the constraints
+        for i in range(self.nv):
+            new_var(f'a_{i}')
+
+        G = self.graph
+        enc = CNF(from_clauses=self.constraints)
+        enc.append([new_var(f'p_{self.root}')])
+        for nd in G.nodes:
+            # terminals of other classes end the path, and sub-graphs leading
+            # only to the predicted class are never entered
+            if not G.out_degree(nd) or not self.can_reach_other(nd):
+                continue
+            a = new_var('a_{0}'.format(G.nodes[nd]['var']))
+            edges = []
+            for chd in G.successors(nd):
+                if not self.can_reach_other(chd):
+                    continue
+                e = new_var(f'e_{nd}_{chd}')
+                edges.append(e)
+                enc.append([-e, new_var(f'p_{chd}')])
+                if not G.edges[nd, chd]['label']:
+                    enc.append([-e, -a])
+            # a node on the path is left through one of its edges
+            enc.append([-new_var(f'p_{nd}')] + edges)
+
+        return enc
+
     def decision_path(self):
         """
             Get decision path which consistent with given instance of XpG.
@@ -162,6 +330,19 @@ class XpGraph(object):
         assert len(p)
         return p
 
+    def decision_leaf(self):
+        """
+            Get the terminal node reached by the given instance of XpG.
+
+            :return: terminal node of the decision path.
+        """
+
+        r = self.decision_path()[-1]
+        G = self.graph
+        for s in G.successors(r):
+            if G.edges[r, s]['label']:
+                return s
+
 
 
 #
@@ -185,7 +366,8 @@ class MarcoXpG(object):
             :param fixed: a list of features declared as fixed.
             :param horn: using Horn encoding (True) or graph traverse (False).
             :return: one abductive explanation,
-                        each element in the return Axp is a feature index.
+                        each element in the return Axp is a feature index,
+                        empty if no other class can be reached.
         """
         if fixed:
             fix = fixed.copy()
@@ -200,7 +382,8 @@ class MarcoXpG(object):
 
             :param universal: a list of features declared as universal.
             :return: one contrastive explanation,
-                        each element in the return Cxp is a feature index.
+                        each element in the return Cxp is a feature index,
+                        None if no other class can be reached.
         """
         if universal:
             univ = universal.copy()
@@ -242,32 +425,45 @@ class MarcoXpG(object):
         # i of u_i denote i-th variable
         for i in range(self.xpg.nv):
             new_var(f'u_{i}')
+        # features whose value is entailed by the background constraints
+        # never matter, so they are kept universal in every seed
+        if self.xpg.constraints:
+            with Solver(name="glucose3", bootstrap_with=self.xpg.constraints) as cslv:
+                for i in range(self.xpg.nv):
+                    if not cslv.solve(assumptions=[-(i + 1)]):
+                        slv.add_clause([new_var(f'u_{i}')])
         # initially all features are fixed
         universal = [False for _ in range(self.xpg.nv)]
 
         all_axp = []
         all_cxp = []
 
-        while slv.solve():
-            model = slv.get_model()
-            for lit in model:
-                # extract i from u_i
-                name = vpool.obj(abs(lit)).split(sep='_')
-                # lit > 0 means u_i universal, lit < 0 means u_i fixed
-                universal[int(name[1])] = False if lit < 0 else True
-            if self.xpg.path_to_zero(universal):
-                cxp = self.find_cxp(universal)
-                slv.add_clause([-new_var(f'u_{i}') for i in cxp])
-                all_cxp.append(cxp)
-            else:
-                # get fixed features by flipping value of each element in universal
-                fixed = [not i for i in universal]
-                axp = self.find_axp(fixed)
-                slv.add_clause([new_var(f'u_{i}') for i in axp])
-                all_axp.append(axp)
+        if not self.xpg.path_to_zero([True for _ in range(self.xpg.nv)]):
+            # no other class can be reached (e.g. due to background constraints),
+            # the empty set is then the only AXp and there is no CXp
+            all_axp.append(self.find_axp())
+        else:
+            while slv.solve():
+                model = slv.get_model()
+                for lit in model:
+                    # extract i from u_i
+                    name = vpool.obj(abs(lit)).split(sep='_')
+                    # lit > 0 means u_i universal, lit < 0 means u_i fixed
+                    universal[int(name[1])] = False if lit < 0 else True
+                if self.xpg.path_to_zero(universal):
+                    cxp = self.find_cxp(universal)
+                    slv.add_clause([-new_var(f'u_{i}') for i in cxp])
+                    all_cxp.append(cxp)
+                else:
+                    # get fixed features by flipping value of each element in universal
+                    fixed = [not i for i in universal]
+                    axp = self.find_axp(fixed)
+                    slv.add_clause([new_var(f'u_{i}') for i in axp])
+                    all_axp.append(axp)
 
-        # delete the SAT solver
+        # delete the SAT solvers
         slv.delete()
+        self.xpg.delete()
 
         time = resource.getrusage(resource.RUSAGE_CHILDREN).ru_utime + \
                resource.getrusage(resource.RUSAGE_SELF).ru_utime - time